@@ -1,8 +1,30 @@
 import streamlit as st
 import requests
 import os
+import copy
+import re
 import json
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+import numpy as np
+
+try:
+    import orjson
+
+    def _json_loads(data: bytes):
+        return orjson.loads(data)
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    def _json_loads(data: bytes):
+        return json.loads(data)
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
 
 # =========================
 # 🔐 USER AUTHENTICATION
@@ -10,129 +32,297 @@ import bcrypt
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USER_FILE = os.path.join(BASE_DIR, "users.json")
+# bcrypt cost factor; keep at 12 or higher in production, lower only for dev/CI.
+# Existing hashes keep their original cost, so a store mixing costs has uneven login timing.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
 
 
 # --- Hashing ---
+@st.cache_resource
+def _bcrypt_pool():
+    # Caps how many bcrypt calls run at once so a burst of logins can't take every core
+    # from other sessions' reruns (each session thread already gets bcrypt's GIL release)
+    return ThreadPoolExecutor(max_workers=max(2, (os.cpu_count() or 2) // 2))
+
+
+def _checkpw(pw: bytes, hashed: bytes) -> bool:
+    return _bcrypt_pool().submit(bcrypt.checkpw, pw, hashed).result()
+
+
 def hash_password(password: str) -> str:
     pw = password.encode("utf-8")
-    return bcrypt.hashpw(pw, bcrypt.gensalt()).decode("utf-8")
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return _bcrypt_pool().submit(bcrypt.hashpw, pw, salt).result().decode("utf-8")
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    return _checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+@st.cache_resource
+def _dummy_hash(rounds: int) -> bytes:
+    # Checked against on unknown usernames so failed logins take the same time either way
+    return bcrypt.hashpw(b"x", bcrypt.gensalt(rounds=rounds))
+
+
+_BCRYPT_RE = re.compile(r"\$2[aby]\$\d\d\$[./A-Za-z0-9]{53}")
 
 
 def is_bcrypt_hash(s: str) -> bool:
-    return isinstance(s, str) and s.startswith("$2b$") and len(s) > 50
+    return isinstance(s, str) and _BCRYPT_RE.fullmatch(s) is not None
 
 
 # --- JSON I/O ---
+# users.json is a snapshot; users.jsonl is an append-only log of changes made since it was written
+USER_LOG = os.path.join(BASE_DIR, "users.jsonl")
+# Fold the log back into the snapshot once it grows past this multiple of the snapshot size
+COMPACT_RATIO = 4
+
+
+@st.cache_resource
+def _users_cache():
+    # Shared across reruns and sessions; refreshed whenever either file changes on disk.
+    # Hold "lock" across any load/mutate/save sequence since session threads run concurrently.
+    return {"stamp": None, "users": None, "by_name": None, "validated": set(), "lock": threading.RLock()}
+
+
+_USERS_CACHE = _users_cache()
+
+
+def _file_stamp(path):
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+def _check_hash(u):
+    validated = _USERS_CACHE["validated"]
+    pw = u.get("password", "")
+    if pw in validated:
+        return
+    if not is_bcrypt_hash(pw):
+        raise ValueError(
+            f"❌ Refusing to save raw password for user '{u.get('username')}'. Hash it first!"
+        )
+    validated.add(pw)
+
+
+def _apply_record(users, by_name, record):
+    if record.get("op") == "create":
+        user = record["user"]
+        key = user["username"].lower()
+        existing = by_name.get(key)
+        if existing is not None:
+            # Already in the snapshot if a compaction was interrupted before the log was removed
+            existing.clear()
+            existing.update(user)
+        else:
+            users.append(user)
+            by_name[key] = user
+    elif record.get("op") == "update":
+        u = by_name.get(record["username"].lower())
+        if u is not None:
+            u.update(record["fields"])
+
+
 def load_users():
-    if not os.path.exists(USER_FILE):
+    with _USERS_CACHE["lock"]:
+        return _load_users_locked()
+
+
+def _load_users_locked():
+    snapshot = _file_stamp(USER_FILE)
+    if snapshot is None:
         with open(USER_FILE, "w", encoding="utf-8") as f:
             json.dump({"users": []}, f)
-    with open(USER_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)["users"]
+        snapshot = _file_stamp(USER_FILE)
+    stamp = (snapshot, _file_stamp(USER_LOG))
+    if _USERS_CACHE["stamp"] == stamp:
+        return _USERS_CACHE["users"]
+    with open(USER_FILE, "rb") as f:
+        users = _json_loads(f.read())["users"]
+    by_name = {u["username"].lower(): u for u in users}
+    try:
+        with open(USER_LOG, "rb") as f:
+            for line in f:
+                try:
+                    record = _json_loads(line)
+                except ValueError:
+                    continue  # torn write from a crash mid-append
+                _apply_record(users, by_name, record)
+    except FileNotFoundError:
+        pass
+    _USERS_CACHE["validated"].clear()
+    _USERS_CACHE["users"] = users
+    _USERS_CACHE["by_name"] = by_name
+    _USERS_CACHE["stamp"] = stamp
+    return users
 
 
 def save_users(users):
+    with _USERS_CACHE["lock"]:
+        _save_users_locked(users)
+
+
+def _save_users_locked(users):
     for u in users:
-        if not is_bcrypt_hash(u.get("password", "")):
-            raise ValueError(
-                f"❌ Refusing to save raw password for user '{u.get('username')}'. Hash it first!"
-            )
-    with open(USER_FILE, "w", encoding="utf-8") as f:
-        json.dump({"users": users}, f, indent=4)
+        _check_hash(u)
+    data = _json_dumps({"users": users})
+    # Write to a temp file and swap it in so a crash never leaves a half-written store
+    fd, tmp_path = tempfile.mkstemp(dir=BASE_DIR, prefix=".users-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, USER_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    # The snapshot now holds everything the log did
+    try:
+        os.remove(USER_LOG)
+    except FileNotFoundError:
+        pass
+    _USERS_CACHE["users"] = users
+    _USERS_CACHE["by_name"] = {u["username"].lower(): u for u in users}
+    _USERS_CACHE["stamp"] = (_file_stamp(USER_FILE), None)
+
+
+def _append_record(record):
+    with open(USER_LOG, "a+b") as f:
+        data = _json_dumps(record)
+        # A crash mid-append leaves the log without a trailing newline; start a fresh line
+        # so this record is not glued onto the torn one and skipped on replay
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                data = b"\n" + data
+        f.write(data)
+
+
+def _compact_if_needed(users):
+    snapshot = _file_stamp(USER_FILE)
+    log = _file_stamp(USER_LOG)
+    if log[1] > COMPACT_RATIO * snapshot[1]:
+        save_users(users)
+    else:
+        _USERS_CACHE["stamp"] = (snapshot, log)
 
 
 def get_user(username):
-    users = load_users()
-    for u in users:
-        if u["username"].lower() == username.lower():
-            return u
-    return None
+    # Hand back a copy so session state never shares dicts with the cache
+    with _USERS_CACHE["lock"]:
+        load_users()
+        return copy.deepcopy(_USERS_CACHE["by_name"].get(username.lower()))
+
+
+def update_user(username, **fields):
+    fields = copy.deepcopy(fields)
+    with _USERS_CACHE["lock"]:
+        users = load_users()
+        u = _USERS_CACHE["by_name"].get(username.lower())
+        if u is None:
+            return
+        if "password" in fields:
+            _check_hash({"username": u["username"], **fields})
+        _append_record({"op": "update", "username": u["username"], "fields": fields})
+        u.update(fields)
+        _compact_if_needed(users)
 
 
 def update_user_groups(username, groups):
-    users = load_users()
-    for u in users:
-        if u["username"].lower() == username.lower():
-            u["groups"] = groups
-    save_users(users)
+    update_user(username, groups=groups)
 
 
 def update_user_plan(username, plan_type, plan_duration):
-    users = load_users()
-    for u in users:
-        if u["username"].lower() == username.lower():
-            u["plan_type"] = plan_type
-            u["plan_duration"] = plan_duration
-    save_users(users)
+    update_user(username, plan_type=plan_type, plan_duration=plan_duration)
 
 
 def user_exists(username: str) -> bool:
-    users = load_users()
-    return any(u["username"].lower() == username.lower() for u in users)
+    with _USERS_CACHE["lock"]:
+        load_users()
+        return username.lower() in _USERS_CACHE["by_name"]
 
 
 def create_user(username: str, password: str, plan_type="Basic", plan_duration="Monthly"):
-    users = load_users()
     if user_exists(username):
         return False
+    # Hash outside the lock so a slow bcrypt call does not stall other sessions
     hashed_pw = hash_password(password)
-    users.append(
-        {
-            "username": username,
-            "password": hashed_pw,
-            "groups": {},
-            "plan_type": plan_type,
-            "plan_duration": plan_duration,
-        }
-    )
-    save_users(users)
+    user = {
+        "username": username,
+        "password": hashed_pw,
+        "groups": {},
+        "plan_type": plan_type,
+        "plan_duration": plan_duration,
+    }
+    with _USERS_CACHE["lock"]:
+        users = load_users()
+        if username.lower() in _USERS_CACHE["by_name"]:
+            return False
+        _check_hash(user)
+        _append_record({"op": "create", "user": user})
+        users.append(user)
+        _USERS_CACHE["by_name"][username.lower()] = user
+        _compact_if_needed(users)
     return True
 
 
+def _dummy_rounds() -> int:
+    # Stored hashes keep the cost they were made with, which may exceed BCRYPT_ROUNDS;
+    # match the most expensive one so an unknown username is never the fast path
+    with _USERS_CACHE["lock"]:
+        load_users()
+        costs = [
+            int(u["password"][4:6])
+            for u in _USERS_CACHE["by_name"].values()
+            if is_bcrypt_hash(u.get("password"))
+        ]
+    return max(costs, default=BCRYPT_ROUNDS)
+
+
 def verify_user(username: str, password: str):
-    users = load_users()
-    for u in users:
-        if u["username"].lower() == username.lower():
-            if verify_password(password, u["password"]):
-                return u["username"]
+    with _USERS_CACHE["lock"]:
+        load_users()
+        u = _USERS_CACHE["by_name"].get(username.lower())
+        if u is not None:
+            name, hashed = u["username"], u["password"]
+    if u is None:
+        _checkpw(password.encode("utf-8"), _dummy_hash(_dummy_rounds()))
+        return None
+    if verify_password(password, hashed):
+        return name
     return None
 
 
+# Build the dummy hash up front so the first unknown-username login doesn't also pay for hashing
+_dummy_hash(_dummy_rounds())
+
+
 # =========================
 # 🧠 SESSION STATE SETUP
 # =========================
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
-if "user_name" not in st.session_state:
-    st.session_state.user_name = ""
-if "login_username" not in st.session_state:
-    st.session_state.login_username = ""
-if "login_password" not in st.session_state:
-    st.session_state.login_password = ""
-if "signup_username" not in st.session_state:
-    st.session_state.signup_username = ""
-if "signup_password" not in st.session_state:
-    st.session_state.signup_password = ""
-
-# App defaults
-if "page" not in st.session_state:
-    st.session_state.page = "plan_selection"
-if "plan_type" not in st.session_state:
-    st.session_state.plan_type = "Basic"
-if "plan_duration" not in st.session_state:
-    st.session_state.plan_duration = "Monthly"
-if "budget_remaining" not in st.session_state:
-    st.session_state.budget_remaining = 0.0
-if "budget_set" not in st.session_state:
-    st.session_state.budget_set = 0.0
-if "loop_active" not in st.session_state:
-    st.session_state.loop_active = False
-if "show_split_results" not in st.session_state:
-    st.session_state.show_split_results = False
+_DEFAULTS = {
+    "logged_in": False,
+    "user_name": "",
+    "user_loaded": False,
+    "login_username": "",
+    "login_password": "",
+    "signup_username": "",
+    "signup_password": "",
+    # App defaults
+    "page": "plan_selection",
+    "plan_type": "Basic",
+    "plan_duration": "Monthly",
+    "budget_remaining": 0.0,
+    "budget_set": 0.0,
+    "loop_active": False,
+    "show_split_results": False,
+}
+for k, v in _DEFAULTS.items():
+    st.session_state.setdefault(k, v)
 
 # =========================
 # 🔑 LOGIN / SIGN-UP PAGE
@@ -143,10 +333,12 @@ if not st.session_state.logged_in:
     choice = st.radio("Select an option:", ["Login", "Create Account"])
 
     if choice == "Login":
-        st.text_input("Username", key="login_username")
-        st.text_input("Password", type="password", key="login_password")
+        with st.form("login_form"):
+            st.text_input("Username", key="login_username")
+            st.text_input("Password", type="password", key="login_password")
+            submitted = st.form_submit_button("Login")
 
-        if st.button("Login"):
+        if submitted:
             username = st.session_state.login_username.strip()
             password = st.session_state.login_password
             if not username or not password:
@@ -162,16 +354,19 @@ if not st.session_state.logged_in:
                         st.session_state.plan_type = ud.get("plan_type", "Basic")
                         st.session_state.plan_duration = ud.get("plan_duration", "Monthly")
                         st.session_state.groups = ud.get("groups", {})
+                        st.session_state.user_loaded = True
                     st.success(f"✅ Welcome back, {name}!")
                     st.rerun()
                 else:
                     st.error("❌ Invalid username or password.")
 
     elif choice == "Create Account":
-        st.text_input("Choose a Username", key="signup_username")
-        st.text_input("Choose a Password", type="password", key="signup_password")
+        with st.form("signup_form"):
+            st.text_input("Choose a Username", key="signup_username")
+            st.text_input("Choose a Password", type="password", key="signup_password")
+            submitted = st.form_submit_button("Create Account")
 
-        if st.button("Create Account"):
+        if submitted:
             username = st.session_state.signup_username.strip()
             password = st.session_state.signup_password
             if not username or not password:
@@ -193,8 +388,7 @@ if not st.session_state.logged_in:
 st.set_page_config(page_title="SplitLah", page_icon="💸")
 
 # Floating animation
-st.markdown(
-    """
+_FLOATING_MONEY_HTML = """
     <style>
     .floating-money {
         position: fixed; top: 0; left: 0; width: 100%; height: 100%;
@@ -222,29 +416,71 @@ st.markdown(
         <span style="top:75%;left:15%;animation-delay:12s;">💲</span>
         <span style="top:85%;left:50%;animation-delay:14s;">💵</span>
     </div>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+st.markdown(_FLOATING_MONEY_HTML, unsafe_allow_html=True)
 
 # Logo
 logo_path = os.path.join(BASE_DIR, "splitlahlogo.png")
-if os.path.exists(logo_path):
+
+
+@st.cache_resource
+def _logo_exists():
+    # Checked once per server process rather than on every rerun
+    return os.path.exists(logo_path)
+
+
+_LOGO_EXISTS = _logo_exists()
+if _LOGO_EXISTS:
     st.sidebar.image(logo_path, use_container_width=True)
 
 # Load user groups into session (if not already loaded)
 current_user = st.session_state.user_name
-ud = get_user(current_user)
-if ud:
-    st.session_state.groups = ud.get("groups", {})
-    # also ensure plan stored
-    st.session_state.plan_type = ud.get("plan_type", st.session_state.plan_type)
-    st.session_state.plan_duration = ud.get("plan_duration", st.session_state.plan_duration)
-else:
-    st.session_state.groups = {}
+if not st.session_state.user_loaded:
+    ud = get_user(current_user)
+    if ud:
+        st.session_state.groups = ud.get("groups", {})
+        # also ensure plan stored
+        st.session_state.plan_type = ud.get("plan_type", st.session_state.plan_type)
+        st.session_state.plan_duration = ud.get("plan_duration", st.session_state.plan_duration)
+    else:
+        st.session_state.groups = {}
+    st.session_state.user_loaded = True
 
 # helper to persist current session groups to user's JSON
 def save_current_groups():
-    update_user_groups(st.session_state.user_name, st.session_state.groups)
+    update_user(st.session_state.user_name, groups=st.session_state.groups)
+
+# --- Helper: Sidebar ---
+BASIC_MENU = ("🏠 Home", "1️⃣ Create Groups", "2️⃣ Normal Split")
+PREMIUM_MENU = BASIC_MENU + ("3️⃣ Split within Budget", "4️⃣ Split + Currency")
+
+
+def render_sidebar(plan_type, duration):
+    # 👋 Welcome message above the plan
+    if st.session_state.get("user_name"):
+        st.sidebar.markdown(f"### 👋 Welcome {st.session_state.user_name}!")
+    if plan_type.startswith("Basic"):
+        st.sidebar.markdown(f"**Current Plan:** {plan_type}")
+    elif plan_type.startswith("Premium"):
+        st.sidebar.markdown(f"**Current Plan:** {plan_type} ({duration})")
+    menu_options = PREMIUM_MENU if plan_type.startswith("Premium") else BASIC_MENU
+    return st.sidebar.radio("📋 Main Menu", menu_options)
+
+
+# --- Helper: Member name editor ---
+def member_editor(num_rows, key):
+    # The seed rows stay fixed for a given count so the editor's own edits apply cleanly;
+    # when the count changes, names entered so far are carried into the new rows
+    seed = st.session_state.get(f"{key}_seed")
+    if seed is None or len(seed) != num_rows:
+        names = st.session_state.get(f"{key}_names", [])
+        seed = names[:num_rows] + [""] * (num_rows - len(names))
+        st.session_state[f"{key}_seed"] = seed
+    edited = st.data_editor({"name": list(seed)}, num_rows="dynamic", key=f"{key}_{num_rows}")
+    names = [n.strip() for n in edited["name"] if n and n.strip()]
+    st.session_state[f"{key}_names"] = names
+    return names
+
 
 # --- Helper: Select or Create Group ---
 def select_group():
@@ -258,7 +494,12 @@ def select_group():
             members = []
     else:
         num_people = int(st.number_input("Number of people:", min_value=1, step=1, key="num_people_input"))
-        members = [st.text_input(f"Enter name for person {i+1}:", key=f"person_{i}") for i in range(num_people)]
+        # Names are sent together on submit instead of rerunning after each edit
+        with st.form("members_form"):
+            members = member_editor(num_people, "members_editor")
+            st.form_submit_button("✅ Set Members")
+        if not members:
+            st.info("Type the member names, then press ✅ Set Members.")
     st.session_state["current_members"] = members
     return members
 
@@ -270,11 +511,13 @@ def split_by_percentage(total, members, key_prefix="percent"):
         key = f"{key_prefix}_{i}_{name}_pct"
         val = st.number_input(f"{name}'s share (%)", min_value=0.0, max_value=100.0, step=0.01, key=key)
         percentages.append(float(val))
-    total_percent = sum(percentages)
-    if abs(total_percent - 100) > 0.01:
+    arr = np.asarray(percentages, dtype=np.float64)
+    total_percent = float(arr.sum())
+    if abs(total_percent - 100.0) > 0.01:
         st.warning(f"⚠️ Total = {total_percent:.2f}% (must equal 100%)")
         return None
-    return {name: (pct / 100) * total for name, pct in zip(members, percentages)}
+    shares = arr * (total / 100.0)
+    return dict(zip(members, shares.tolist()))
 
 
 def split_by_money(total, members, key_prefix="money"):
@@ -283,7 +526,7 @@ def split_by_money(total, members, key_prefix="money"):
         key = f"{key_prefix}_{i}_{name}_amt"
         val = st.number_input(f"{name}'s amount ($)", min_value=0.0, step=0.01, key=key)
         amounts.append(float(val))
-    total_entered = sum(amounts)
+    total_entered = float(np.asarray(amounts, dtype=np.float64).sum())
     if total_entered == 0:
         st.info("Enter each person's contribution.")
         return None
@@ -296,21 +539,113 @@ def split_by_money(total, members, key_prefix="money"):
         st.warning(f"⚠️ Total entered ({total_entered:.2f}) is below the bill ({total:.2f}).")
     return None
 
+
+# --- Helpers: Staged splits (inputs first, results on button press) ---
+def split_by_percentage_staged(total, members, key_prefix="percent", calculate=False):
+    unique_prefix = f"{key_prefix}_{st.session_state.run_id}"
+    if not calculate:
+        total_percentage = 0
+        for i, name in enumerate(members):
+            key = f"{unique_prefix}_{i}_{name}_pct"
+            val = st.number_input(
+                f"{name}'s share (%)",
+                min_value=0.0,
+                max_value=100.0,
+                step=0.1,
+                key=key,
+            )
+            total_percentage += val
+        st.write(f"Total entered: **{total_percentage:.1f}%** **(Must be 100%)**")
+    else:
+        total_percentage = sum(
+            st.session_state.get(f"{unique_prefix}_{i}_{name}_pct", 0)
+            for i, name in enumerate(members)
+        )
+        if abs(total_percentage - 100) > 0.01:
+            st.warning("⚠️ Percentages must total **100%**.")
+        else:
+            st.subheader("💰 Split Results (By Percentage)")
+            for i, name in enumerate(members):
+                pct = st.session_state.get(f"{unique_prefix}_{i}_{name}_pct", 0)
+                amount = total * (pct / 100)
+                st.write(f"**{name}** pays: **${amount:.2f}**")
+
+
+def split_by_money_staged(total, members, key_prefix="money", calculate=False):
+    unique_prefix = f"{key_prefix}_{st.session_state.run_id}"
+    if not calculate:
+        for i, name in enumerate(members):
+            key = f"{unique_prefix}_{i}_{name}_amt"
+            st.number_input(
+                f"{name}'s contribution ($)",
+                min_value=0.0,
+                step=0.01,
+                key=key,
+            )
+    else:
+        total_entered = sum(
+            st.session_state.get(f"{unique_prefix}_{i}_{name}_amt", 0)
+            for i, name in enumerate(members)
+        )
+        if abs(total_entered - total) > 0.01:
+            st.warning(
+                f"⚠️ The total entered (${total_entered:.2f}) does not match the spend amount (${total:.2f})."
+            )
+        else:
+            st.subheader("💰 Split Results (By Money)")
+            for i, name in enumerate(members):
+                amt = st.session_state.get(f"{unique_prefix}_{i}_{name}_amt", 0)
+                st.write(f"**{name}** pays: **${amt:.2f}**")
+
+
 # --- Live Exchange Rates ---
-@st.cache_data(ttl=3600)
+_RATES_PATH = os.path.join(BASE_DIR, "rates.json")
+_RATES_TTL = 3600
+
+
+def _write_rates_cache(rates):
+    fd, tmp_path = tempfile.mkstemp(dir=BASE_DIR, prefix=".rates-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"ts": time.time(), "rates": rates}, f)
+        os.replace(tmp_path, _RATES_PATH)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@st.cache_data(ttl=_RATES_TTL)
 def get_live_rates():
+    # Disk copy survives server restarts, so a cold start skips the network round-trip
+    stale = None
+    try:
+        with open(_RATES_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        stale = cached["rates"]
+        if time.time() - cached["ts"] < _RATES_TTL:
+            return stale
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
     url = "https://open.er-api.com/v6/latest/USD"
     try:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         if "rates" in data:
+            try:
+                _write_rates_cache(data["rates"])
+            except OSError:
+                pass
             return data["rates"]
     except Exception:
-        return {"USD":1.0,"EUR":0.91,"JPY":148.5,"MYR":4.6,"INR":83.5,"SGD":1.35}
+        pass
+    # Out-of-date rates beat the hardcoded handful when the API is unreachable
+    if stale:
+        return stale
+    return {"USD":1.0,"EUR":0.91,"JPY":148.5,"MYR":4.6,"INR":83.5,"SGD":1.35}
 
 rates = get_live_rates()
-all_currencies = sorted(rates.keys())
 
 # --- Currency Name Mapping ---
 try:
@@ -323,15 +658,22 @@ except ImportError:
         "CAD":"Canada", "CHF":"Switzerland", "CNY":"China", "HKD":"Hong Kong"
     }
 
-def format_currency(c):
-    return f"{c} ({currency_country_map.get(c,'Unknown')})"
+# Display labels are rebuilt only when the rates change, not on every rerun
+@st.cache_resource(ttl=_RATES_TTL)
+def _currency_options(codes):
+    options = sorted(codes)
+    labels = {c: f"{c} ({currency_country_map.get(c, 'Unknown')})" for c in options}
+    default_index = options.index("USD") if "USD" in options else 0
+    return options, labels, default_index
+
+all_currencies, currency_labels, default_currency_index = _currency_options(tuple(rates))
 
 # -----------------------
 # PAGE FLOW (home / plan / main)
 # -----------------------
 if st.session_state.page == "plan_selection":
     st.title("Welcome to SplitLah 💸")
-    if os.path.exists(logo_path):
+    if _LOGO_EXISTS:
         st.image(logo_path, width=150)
     st.write(
         """
@@ -362,12 +704,18 @@ if st.session_state.page == "plan_selection":
 
     if st.button("🚀 Continue to App"):
         # persist plan to user record
-        update_user_plan(st.session_state.user_name, st.session_state.plan_type, st.session_state.plan_duration)
+        update_user(
+            st.session_state.user_name,
+            plan_type=st.session_state.plan_type,
+            plan_duration=st.session_state.plan_duration,
+        )
+        st.session_state.user_loaded = False
         st.session_state.page = "main"
         st.rerun()
     if st.button("🚪 Log Out"):
         st.session_state.logged_in = False
         st.session_state.user_name = ""
+        st.session_state.user_loaded = False
         st.session_state.page = "plan_selection"
         st.success("✅ You have logged out successfully.")
         st.rerun()
@@ -376,21 +724,8 @@ elif st.session_state.page == "main":
     plan_type = st.session_state.plan_type
     duration = st.session_state.plan_duration
 
- # 👋 Welcome message above the plan
-    if "user_name" in st.session_state and st.session_state.user_name:
-        st.sidebar.markdown(f"### 👋 Welcome {st.session_state.user_name}!")
-    if plan_type.startswith("Basic"):
-        st.sidebar.markdown(f"**Current Plan:** {plan_type}")  
-    elif plan_type.startswith("Premium"):
-        st.sidebar.markdown(f"**Current Plan:** {plan_type} ({duration})")
-
+    menu = render_sidebar(plan_type, duration)
 
-    menu_options = ["🏠 Home", "1️⃣ Create Groups", "2️⃣ Normal Split"]
-    if plan_type.startswith("Premium"):
-        menu_options += ["3️⃣ Split within Budget", "4️⃣ Split + Currency"]
-
-    menu = st.sidebar.radio("📋 Main Menu", menu_options)
-        
 # Home
     if menu == "🏠 Home":
         st.header("🏠 SplitLah Home")
@@ -418,7 +753,7 @@ elif st.session_state.page == "main":
         new_group = st.text_input("Enter group name:")
         num_members = int(st.number_input("Number of members:", min_value=1, step=1))
         if new_group:
-            members = [st.text_input(f"Member {i+1} name:", key=f"{new_group}_m_{i}") for i in range(num_members)]
+            members = member_editor(num_members, f"{new_group}_members")
             if st.button("💾 Save Group"):
                 valid = [m for m in members if m]
                 if valid:
@@ -489,74 +824,21 @@ elif st.session_state.page == "main":
         if "run_id" not in st.session_state:
             st.session_state.run_id = str(uuid.uuid4())[:8]
 
-        def split_by_percentage(total, members, key_prefix="percent", calculate=False):
-            unique_prefix = f"{key_prefix}_{st.session_state.run_id}"
-            if not calculate:
-                total_percentage = 0
-                for i, name in enumerate(members):
-                    key = f"{unique_prefix}_{i}_{name}_pct"
-                    val = st.number_input(
-                        f"{name}'s share (%)",
-                        min_value=0.0,
-                        max_value=100.0,
-                        step=0.1,
-                        key=key,
-                    )
-                    total_percentage += val
-                st.write(f"Total entered: **{total_percentage:.1f}%** **(Must be 100%)**")
-            else:
-                total_percentage = sum(
-                    st.session_state.get(f"{unique_prefix}_{i}_{name}_pct", 0)
-                    for i, name in enumerate(members)
-                )
-                if abs(total_percentage - 100) > 0.01:
-                    st.warning("⚠️ Percentages must total **100%**.")
-                else:
-                    st.subheader("💰 Split Results (By Percentage)")
-                    for i, name in enumerate(members):
-                        pct = st.session_state.get(f"{unique_prefix}_{i}_{name}_pct", 0)
-                        amount = total * (pct / 100)
-                        st.write(f"**{name}** pays: **${amount:.2f}**")
-
-        def split_by_money(total, members, key_prefix="money", calculate=False):
-            unique_prefix = f"{key_prefix}_{st.session_state.run_id}"
-            if not calculate:
-                for i, name in enumerate(members):
-                    key = f"{unique_prefix}_{i}_{name}_amt"
-                    st.number_input(
-                        f"{name}'s contribution ($)",
-                        min_value=0.0,
-                        step=0.01,
-                        key=key,
-                    )
-            else:
-                total_entered = sum(
-                    st.session_state.get(f"{unique_prefix}_{i}_{name}_amt", 0)
-                    for i, name in enumerate(members)
-                )
-                if abs(total_entered - total) > 0.01:
-                    st.warning(
-                        f"⚠️ The total entered (${total_entered:.2f}) does not match the spend amount (${total:.2f})."
-                    )
-                else:
-                    st.subheader("💰 Split Results (By Money)")
-                    for i, name in enumerate(members):
-                        amt = st.session_state.get(f"{unique_prefix}_{i}_{name}_amt", 0)
-                        st.write(f"**{name}** pays: **${amt:.2f}**")
-
         st.header("📊 Split within a Budget")
         members = select_group()
-        if members:
-            if not st.session_state.loop_active:
-                budget = st.number_input(
-                    "Enter your total budget ($):",
-                    min_value=0.00,
-                    step=0.01,
-                    value=max(0.00, st.session_state.budget_remaining) if st.session_state.budget_remaining != 0 else 0.00
-                )
-                if st.session_state.budget_remaining == 0 or st.session_state.budget_set != budget:
-                    st.session_state.budget_remaining = budget
-                    st.session_state.budget_set = budget
+        if not members:
+            st.warning("Add members first: enter their names and press ✅ Set Members, or pick a saved group.")
+            st.stop()
+        if not st.session_state.loop_active:
+            budget = st.number_input(
+                "Enter your total budget ($):",
+                min_value=0.00,
+                step=0.01,
+                value=max(0.00, st.session_state.budget_remaining) if st.session_state.budget_remaining != 0 else 0.00
+            )
+            if st.session_state.budget_remaining == 0 or st.session_state.budget_set != budget:
+                st.session_state.budget_remaining = budget
+                st.session_state.budget_set = budget
 
         st.write(f"💡 Remaining budget: **${st.session_state.budget_remaining:.2f}**")
         spend_amount = st.number_input("Enter amount to spend now ($):", min_value=0.00, step=0.01)
@@ -564,9 +846,9 @@ elif st.session_state.page == "main":
 
     # --- Show input fields immediately ---
         if option == "By Percentage":
-            split_by_percentage(spend_amount, members, key_prefix="budget", calculate=False)
+            split_by_percentage_staged(spend_amount, members, key_prefix="budget", calculate=False)
         elif option == "By Money":
-            split_by_money(spend_amount, members, key_prefix="budget_money", calculate=False)
+            split_by_money_staged(spend_amount, members, key_prefix="budget_money", calculate=False)
 
     # --- Perform split when button pressed ---
         if st.button("✅ Split This Amount"):
@@ -579,10 +861,10 @@ elif st.session_state.page == "main":
                         st.write(f"{name} pays: **${each:.2f}**")
 
                 elif option == "By Percentage":
-                    split_by_percentage(spend_amount, members, key_prefix="budget", calculate=True)
+                    split_by_percentage_staged(spend_amount, members, key_prefix="budget", calculate=True)
 
                 elif option == "By Money":
-                    split_by_money(spend_amount, members, key_prefix="budget_money", calculate=True)
+                    split_by_money_staged(spend_amount, members, key_prefix="budget_money", calculate=True)
 
             st.session_state.budget_remaining -= spend_amount
 
@@ -624,8 +906,8 @@ elif st.session_state.page == "main":
         st.header("💱 Split + Currency Conversion")
         members = select_group()
         if members:
-            from_code = st.selectbox("From Currency", all_currencies, index=all_currencies.index("USD") if "USD" in all_currencies else 0, format_func=format_currency)
-            to_code = st.selectbox("To Currency", all_currencies, index=all_currencies.index("USD") if "USD" in all_currencies else 0, format_func=format_currency)
+            from_code = st.selectbox("From Currency", all_currencies, index=default_currency_index, format_func=currency_labels.__getitem__)
+            to_code = st.selectbox("To Currency", all_currencies, index=default_currency_index, format_func=currency_labels.__getitem__)
             total = st.number_input(f"Enter total bill amount ({from_code}):", min_value=0.0, step=0.01)
             option = st.radio("Choose how to split:", ["Evenly","By Percentage","By Money"])
             if total>0: